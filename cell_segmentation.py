@@ -2,6 +2,8 @@ import cv2
 import numpy as np
 import os
 
+from preprocessing import preprocess_table
+
 def segment_cells(config, 
                   cropped_table_path="output/cropped_table.png", 
                   cells_output_dir="output/cells"):
@@ -17,6 +19,8 @@ def segment_cells(config,
       - "column_proportions": list of floats in ascending order (0.0 .. 1.0)
       - "num_rows": int (number of numeric rows)
       - "num_columns": int (number of numeric columns)
+      - "preprocessing": optional filter chain (see preprocessing.preprocess_table),
+        applied once to the whole table before the cells are sliced out
     
     Each cell is saved as:
         cells_output_dir/cell_row{i}_col{j}.png
@@ -26,8 +30,11 @@ def segment_cells(config,
     if cropped_table is None:
         raise IOError(f"Cropped table image not found at {cropped_table_path}")
 
+    # Preprocess the whole table in one pass; cells are sliced from the result
+    cropped_table = preprocess_table(cropped_table, config.get("preprocessing"))
+
     # Get image dimensions
-    table_height, table_width, _ = cropped_table.shape
+    table_height, table_width = cropped_table.shape[:2]
 
     # Read row/column proportions from config
     row_proportions = config.get("row_proportions", [])
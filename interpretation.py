@@ -1,5 +1,20 @@
 import csv
 
+# Rows each interpretation section reads, by section name. Sections are
+# listed in the order they appear in the report. Editing a cell in one of
+# these rows only requires recomputing the sections that list it.
+SECTION_ROWS = {
+    "test_grade": ("testgrade",),
+    "spirometry": ("fvc", "fev1", "fev1/fvc"),
+    "bronchodilator": ("fvc", "fev1"),
+    "lung_volumes": ("tlcpleth", "rvpleth", "rv/tlcpleth", "fvc"),
+    "dlco": ("dlcocor", "dlcounc"),
+}
+
+# Row titles that interpret_pft reads. In priority mode (see pipeline.py) these
+# rows are OCR'd and interpreted before the rest of the table.
+INTERPRETATION_ROWS = tuple(dict.fromkeys(title for rows in SECTION_ROWS.values() for title in rows))
+
 def to_float(val):
     """Try converting a string to float; return None if conversion fails."""
     try:
@@ -16,58 +31,29 @@ def get_val(row, post_key, pre_key):
         val = to_float(row.get(pre_key, ""))
     return val
 
-def interpret_pft(csv_path):
-    """
-    Reads the CSV file with table data and returns a multiline string interpretation of the PFT results.
-    
-    Expected CSV structure:
-      - Header row: ["var", "pre", "zscore", "lln", "%predpre", "post", "zscore post", "%predpost", "%changepost"]
-      - The first column of each subsequent row is the row title.
-    
-    Interpretation Guidelines:
-      • SPIROMETRY:
-          - Obstruction is defined as FEV1/FVC (post if available, else pre) < LLN and its z‐score (post or pre) < –1.645.
-          - Severity (based on FEV1 z‐score; post if available, else pre):
-                if zscore ≥ –1.645: (not abnormal; should not reach this branch)
-                if –2.5 ≤ zscore < –1.645: mild
-                if –4.0 ≤ zscore < –2.5: moderate
-                if zscore < –4.0: severe
-      • Bronchodilator response is reported only if post values exist.
-      • LUNG VOLUMES:
-          - Restriction is determined using TLC (post if available, else pre) < LLN and TLC z‐score < –1.645,
-            with severity based on FVC z‐score (using the same thresholds as above).
-          - Hyperinflation is flagged if TLC z‐score > +1.65.
-          - Air trapping is described as: “Evidence of air trapping is present” if either RV/TLC z‐score (post or pre) > +1.65 or RV %pred (post if available, else pre) > 175.
-      • DLCO:
-          - Low DLCO is defined as DLCO z‐score < –1.645 with severity graded using the same thresholds.
-      • Test Grade:
-          - If test grade (from row "testgrade") is not "AA", it is noted.
-    
-    Returns a multiline string with section headers.
-    """
-    # Parse CSV into a mapping: row_title -> {column_title: value}
-    data = {}
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-    if not rows or len(rows) < 2:
-        return "No data available."
-    header = rows[0]
-    for row in rows[1:]:
-        row_title = row[0].strip()
-        data[row_title] = dict(zip(header[1:], row[1:]))
-    
-    # Convenience mapping for key rows.
+def restriction_severity(fvc):
+    """Grades restriction severity from the FVC z‐score (post if available, else pre)."""
+    fvc_z = get_val(fvc, "zscore post", "zscore")
+    # Determine restriction severity using FVC z‐score.
+    if fvc_z is not None:
+        if fvc_z >= -1.645:
+            restr_severity = ""
+        elif fvc_z >= -2.5:
+            restr_severity = "mild"
+        elif fvc_z >= -4.0:
+            restr_severity = "moderate"
+        else:
+            restr_severity = "severe"
+    else:
+        restr_severity = ""
+    return restr_severity
+
+def interpret_spirometry(data):
+    """Spirometry section: obstruction, restriction and mixed patterns."""
     fvc = data.get("fvc", {})
     fev1 = data.get("fev1", {})
     fev1_fvc = data.get("fev1/fvc", {})
-    testgrade = data.get("testgrade", {})
-    tlc = data.get("tlcpleth", {})
-    rv = data.get("rvpleth", {})
-    rv_tlc = data.get("rv/tlcpleth", {})
-    dlco = data.get("dlcocor", {})
-    dlcounc = data.get("dlcounc", {})
-    
+
     ### SPIROMETRY ###
     # Use FEV1/FVC value (post if available, else pre).
     fev1fvc_value = get_val(fev1_fvc, "post", "pre")
@@ -100,18 +86,7 @@ def interpret_pft(csv_path):
     if fvc_post_val is not None and fvc_lln is not None and fvc_z is not None:
         if fvc_post_val < fvc_lln and fvc_z < -1.645:
             possible_restriction = True
-    # Determine restriction severity using FVC z‐score.
-    if fvc_z is not None:
-        if fvc_z >= -1.645:
-            restr_severity = ""
-        elif fvc_z >= -2.5:
-            restr_severity = "mild"
-        elif fvc_z >= -4.0:
-            restr_severity = "moderate"
-        else:
-            restr_severity = "severe"
-    else:
-        restr_severity = ""
+    restr_severity = restriction_severity(fvc)
     
     # Build spirometry section.
     if obstruction and possible_restriction:
@@ -123,7 +98,13 @@ def interpret_pft(csv_path):
         spirometry_section = f"Spirometry:\nRestrictive lung function impairment (severity: {restr_severity})."
     else:
         spirometry_section = "Spirometry:\nNormal postbronchodilator spirometry."
-    
+    return spirometry_section
+
+def interpret_bronchodilator(data):
+    """Bronchodilator response section; empty if there are no post values."""
+    fvc = data.get("fvc", {})
+    fev1 = data.get("fev1", {})
+
     ### BRONCHODILATOR RESPONSE ###
     if fvc.get("post") or fev1.get("post"):
         bo_response = False
@@ -140,7 +121,15 @@ def interpret_pft(csv_path):
         bo_section = "Bronchodilator Response:\nPresent." if bo_response else "Bronchodilator Response:\nNot present."
     else:
         bo_section = ""
-    
+    return bo_section
+
+def interpret_lung_volumes(data):
+    """Lung volumes section: restriction, hyperinflation and air trapping."""
+    tlc = data.get("tlcpleth", {})
+    rv = data.get("rvpleth", {})
+    rv_tlc = data.get("rv/tlcpleth", {})
+    restr_severity = restriction_severity(data.get("fvc", {}))
+
     ### LUNG VOLUMES ###
     tlc_post_val = get_val(tlc, "post", "pre")
     tlc_lln_val = to_float(tlc.get("lln", ""))
@@ -160,8 +149,13 @@ def interpret_pft(csv_path):
         lung_vol_section += "\nEvidence of air trapping is present."
     if lung_vol_section.strip() == "Lung Volumes:":
         lung_vol_section = "Lung Volumes:\nNormal lung volumes."
+    return lung_vol_section
+
+def interpret_dlco(data):
+    """DLCO section, preferring the corrected DLCO over the uncorrected one."""
+    dlco = data.get("dlcocor", {})
+    dlcounc = data.get("dlcounc", {})
 
-    
     ### DLCO ###
     dlco_z = to_float(dlco.get("zscore", ""))
     dlco_unc_z = to_float(dlcounc.get("zscore", ""))
@@ -187,25 +181,87 @@ def interpret_pft(csv_path):
             dlco_section = "DLCO:\nNormal DLCO."
         else:
             dlco_section = "DLCO:\nNormal DLCO (uncorrected)."
-    
+    return dlco_section
+
+def interpret_test_grade(data):
+    """Test grade section."""
+    testgrade = data.get("testgrade", {})
+
     ### TEST GRADE ###
     test_grade_val = testgrade.get("post", "").strip().upper() if testgrade.get("post") else ""
     if test_grade_val and test_grade_val != "AA":
         grade_section = f"Test Grade:\n{test_grade_val}."
     else:
         grade_section = "Test Grade:\nAA."
+    return grade_section
+
+SECTION_FUNCTIONS = {
+    "test_grade": interpret_test_grade,
+    "spirometry": interpret_spirometry,
+    "bronchodilator": interpret_bronchodilator,
+    "lung_volumes": interpret_lung_volumes,
+    "dlco": interpret_dlco,
+}
+
+def parse_table(rows):
+    """
+    Parses CSV rows (header first) into a mapping: row_title -> {column_title: value}.
+    """
+    data = {}
+    header = rows[0]
+    for row in rows[1:]:
+        row_title = row[0].strip()
+        data[row_title] = dict(zip(header[1:], row[1:]))
+    return data
+
+def interpretation_sections(data, names=None):
+    """Computes the named interpretation sections (all if None); returns {name: text}."""
+    if names is None:
+        names = SECTION_FUNCTIONS.keys()
+    return {name: SECTION_FUNCTIONS[name](data) for name in names}
+
+def join_sections(sections):
+    """Joins section texts in report order, skipping empty ones (e.g. no bronchodilator data)."""
+    return "\n\n".join(sections[name] for name in SECTION_ROWS if sections.get(name))
+
+def interpret_pft(csv_path):
+    """
+    Reads the CSV file with table data and returns a multiline string interpretation of the PFT results.
+    
+    Expected CSV structure:
+      - Header row: ["var", "pre", "zscore", "lln", "%predpre", "post", "zscore post", "%predpost", "%changepost"]
+      - The first column of each subsequent row is the row title.
     
-    # Build final interpretation.
-    sections = [grade_section, spirometry_section]
-    if bo_section:
-        sections.append(bo_section)
-    sections.extend([lung_vol_section, dlco_section])
-    interpretation = "\n\n".join(sections)
+    Interpretation Guidelines:
+      • SPIROMETRY:
+          - Obstruction is defined as FEV1/FVC (post if available, else pre) < LLN and its z‐score (post or pre) < –1.645.
+          - Severity (based on FEV1 z‐score; post if available, else pre):
+                if zscore ≥ –1.645: (not abnormal; should not reach this branch)
+                if –2.5 ≤ zscore < –1.645: mild
+                if –4.0 ≤ zscore < –2.5: moderate
+                if zscore < –4.0: severe
+      • Bronchodilator response is reported only if post values exist.
+      • LUNG VOLUMES:
+          - Restriction is determined using TLC (post if available, else pre) < LLN and TLC z‐score < –1.645,
+            with severity based on FVC z‐score (using the same thresholds as above).
+          - Hyperinflation is flagged if TLC z‐score > +1.65.
+          - Air trapping is described as: “Evidence of air trapping is present” if either RV/TLC z‐score (post or pre) > +1.65 or RV %pred (post if available, else pre) > 175.
+      • DLCO:
+          - Low DLCO is defined as DLCO z‐score < –1.645 with severity graded using the same thresholds.
+      • Test Grade:
+          - If test grade (from row "testgrade") is not "AA", it is noted.
     
-    return interpretation
+    Returns a multiline string with section headers.
+    """
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        rows = list(reader)
+    if not rows or len(rows) < 2:
+        return "No data available."
+    return join_sections(interpretation_sections(parse_table(rows)))
 
 if __name__ == "__main__":
-    csv_file = "output/table_data.csv"  # Adjust path as needed
+    csv_file = "output/table_1/table_data.csv"  # Adjust path as needed
     report = interpret_pft(csv_file)
     print("PFT Interpretation Report:")
     print(report)
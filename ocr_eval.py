@@ -0,0 +1,202 @@
+"""
+Speed/accuracy evaluation of OCR configurations against a ground-truth corpus.
+
+The corpus is a folder with one subfolder per table, each holding:
+    cropped_table.png   - a cropped table as produced by detect_table(s)
+    table_data.csv      - the hand-verified CSV for that table
+
+A configurations file is a JSON list of config.json overrides, each with a
+"name", e.g.:
+    [
+      {"name": "default"},
+      {"name": "cpu-4threads", "ocr_use_gpu": false, "ocr_cpu_threads": 4},
+      {"name": "batch-32", "ocr_batch_size": 32},
+      {"name": "binarized", "preprocessing": ["grayscale", "binarize"]}
+    ]
+
+Every configuration is run through segment_cells and perform_ocr on every
+table, always with in-process OCR ("use_ocr_service" is forced off) so the
+recognizer settings being compared are the ones actually used. The report compares cell accuracy, sign-correction accuracy and
+interpretation agreement with throughput and per-table latency percentiles.
+
+Run it with:
+    python ocr_eval.py CORPUS_DIR CONFIGS_JSON [--config config.json] [--repeat N] [--csv report.csv]
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from cell_segmentation import segment_cells
+from ocr_paddle import perform_ocr, ocr_settings
+from interpretation import interpret_pft
+
+# Columns whose sign is restored by perform_ocr's sign correction.
+SIGNED_COLUMNS = (2, 6, 8)
+
+def load_corpus(corpus_dir):
+    """Returns (name, cropped_table_path, truth_csv_path) for each table in the corpus."""
+    cases = []
+    for name in sorted(os.listdir(corpus_dir)):
+        case_dir = os.path.join(corpus_dir, name)
+        cropped_path = os.path.join(case_dir, "cropped_table.png")
+        truth_path = os.path.join(case_dir, "table_data.csv")
+        if os.path.isfile(cropped_path) and os.path.isfile(truth_path):
+            cases.append((name, cropped_path, truth_path))
+    return cases
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+def compare_tables(predicted, truth):
+    """
+    Compares two CSV tables (lists of rows, header first) cell by cell.
+    Returns (cells_correct, cells_total, signs_correct, signs_total); only
+    non-title cells that are non-empty in the ground truth are counted.
+    """
+    cells_correct = cells_total = signs_correct = signs_total = 0
+    for r in range(1, len(truth)):
+        truth_row = truth[r]
+        pred_row = predicted[r] if r < len(predicted) else []
+        for c in range(1, len(truth_row)):
+            expected = truth_row[c].strip()
+            if not expected:
+                continue
+            actual = pred_row[c].strip() if c < len(pred_row) else ""
+            cells_total += 1
+            cells_correct += actual == expected
+            if c in SIGNED_COLUMNS and expected[0] in "+-":
+                signs_total += 1
+                signs_correct += bool(actual) and actual[0] == expected[0]
+    return cells_correct, cells_total, signs_correct, signs_total
+
+def describe_recognizer(config):
+    """Returns a short description of the recognizer config selects, e.g. "onnx cpu x4+1 b6"."""
+    settings = ocr_settings(config)
+    backend = settings["ocr_backend"]
+    if backend == "onnx":
+        device = f"cpu x{settings['ocr_cpu_threads']}+{settings['ocr_inter_op_threads']}"
+    elif settings["ocr_use_gpu"]:
+        device = "gpu"
+    else:
+        device = f"cpu x{settings['ocr_cpu_threads']}"
+    return f"{backend} {device} b{settings['ocr_batch_size']}"
+
+def evaluate_configuration(overrides, base_config, cases, work_dir, repeat=1):
+    """
+    Runs one configuration over the corpus and returns its metrics.
+    A warm-up table is run first so model loading is not counted in latency.
+    OCR always runs in-process: a running OCR service would otherwise answer
+    with its own recognizer and ignore the overrides.
+    """
+    config = dict(base_config)
+    config.update({k: v for k, v in overrides.items() if k != "name"})
+    config["use_ocr_service"] = False
+    config_path = os.path.join(work_dir, "config.json")
+    with open(config_path, "w") as f:
+        json.dump(config, f, indent=2)
+
+    def run_case(case_name, cropped_path):
+        case_dir = os.path.join(work_dir, case_name)
+        cells_dir = os.path.join(case_dir, "cells")
+        csv_path = os.path.join(case_dir, "table_data.csv")
+        start = time.perf_counter()
+        segment_cells(config, cropped_table_path=cropped_path, cells_output_dir=cells_dir)
+        perform_ocr(config_path=config_path, cells_output_dir=cells_dir, csv_output_path=csv_path)
+        return csv_path, time.perf_counter() - start
+
+    run_case("warmup", cases[0][1])
+
+    latencies = []
+    totals = np.zeros(4, dtype=np.int64)
+    interpretations_agree = 0
+    for case_name, cropped_path, truth_path in cases:
+        for _ in range(repeat):
+            csv_path, elapsed = run_case(case_name, cropped_path)
+            latencies.append(elapsed)
+        totals += compare_tables(_read_csv(csv_path), _read_csv(truth_path))
+        interpretations_agree += interpret_pft(csv_path) == interpret_pft(truth_path)
+
+    cells_correct, cells_total, signs_correct, signs_total = totals
+    cells_recognized = (config.get("num_rows", 0) - 1) * (config.get("num_columns", 0) - 1) * len(latencies)
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        "name": overrides.get("name", "unnamed"),
+        "recognizer": describe_recognizer(config),
+        "cell_accuracy": cells_correct / cells_total if cells_total else float("nan"),
+        "sign_accuracy": signs_correct / signs_total if signs_total else float("nan"),
+        "interpretation_agreement": interpretations_agree / len(cases),
+        "cells_per_second": cells_recognized / (latencies_ms.sum() / 1000.0),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p90_ms": float(np.percentile(latencies_ms, 90)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+REPORT_COLUMNS = [
+    ("name", "config", "{}"),
+    ("recognizer", "recognizer", "{}"),
+    ("cell_accuracy", "cell acc", "{:.2%}"),
+    ("sign_accuracy", "sign acc", "{:.2%}"),
+    ("interpretation_agreement", "interp agree", "{:.2%}"),
+    ("cells_per_second", "cells/s", "{:.1f}"),
+    ("p50_ms", "p50 ms", "{:.0f}"),
+    ("p90_ms", "p90 ms", "{:.0f}"),
+    ("p99_ms", "p99 ms", "{:.0f}"),
+]
+
+def format_report(results):
+    """Formats results as an aligned comparison table, fastest first."""
+    results = sorted(results, key=lambda r: r["p50_ms"])
+    rows = [[title for _, title, _ in REPORT_COLUMNS]]
+    for result in results:
+        rows.append([fmt.format(result[key]) for key, _, fmt in REPORT_COLUMNS])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(REPORT_COLUMNS))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare OCR configurations on a ground-truth corpus.")
+    parser.add_argument("corpus_dir", help="Folder of <case>/cropped_table.png + <case>/table_data.csv.")
+    parser.add_argument("configs", help="JSON list of config overrides, each with a \"name\".")
+    parser.add_argument("--config", default="config.json", help="Base config the overrides apply to.")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per table, for steadier latencies.")
+    parser.add_argument("--csv", default=None, help="Also write the comparison to this CSV file.")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        base_config = json.load(f)
+    with open(args.configs, "r") as f:
+        configurations = json.load(f)
+    cases = load_corpus(args.corpus_dir)
+    if not cases:
+        raise SystemExit(f"No cropped_table.png/table_data.csv pairs found in {args.corpus_dir}")
+
+    results = []
+    for overrides in configurations:
+        work_dir = tempfile.mkdtemp(prefix="ocr_eval_")
+        try:
+            recognizer = describe_recognizer(dict(base_config, **overrides))
+            print(f"Evaluating {overrides.get('name', 'unnamed')} ({recognizer}) on {len(cases)} table(s)...")
+            results.append(evaluate_configuration(overrides, base_config, cases, work_dir, repeat=args.repeat))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print()
+    print(format_report(results))
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=[key for key, _, _ in REPORT_COLUMNS])
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Comparison saved to {args.csv}")
+
+if __name__ == "__main__":
+    main()
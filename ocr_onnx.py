@@ -0,0 +1,215 @@
+"""
+CPU inference backend for the cell recognizer using ONNX Runtime.
+
+This runs the same PP-OCR English recognition model that PaddleOCR uses,
+exported to ONNX (optionally with int8 dynamic quantization), on the CPU
+with explicit thread controls. Models are only loaded from local files;
+nothing is downloaded at run time.
+
+Select it in config.json with:
+    "ocr_backend": "onnx",
+    "ocr_onnx_model": "models/en_rec_int8.onnx",
+    "ocr_onnx_char_dict": "models/en_dict.txt",
+    "ocr_cpu_threads": 4,          # intra-op threads
+    "ocr_inter_op_threads": 1
+
+Create the model files once, on a machine with paddleocr and paddle2onnx:
+    python ocr_onnx.py export PADDLE_REC_MODEL_DIR --output models/en_rec_int8.onnx --int8
+
+Check the exported model against the stock recognizer on real cells:
+    python ocr_onnx.py validate output/table_1/cells
+The result is recorded next to the model (<model>.validation.json); the
+backend warns when it loads a model without a passing record.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# Input geometry of the PP-OCR recognition models (channels, height, min width).
+REC_IMAGE_SHAPE = (3, 48, 320)
+
+def validation_record_path(model_path):
+    """Returns the path of the validation result recorded for model_path."""
+    return model_path + ".validation.json"
+
+def _file_sha1(path):
+    """Returns the SHA-1 hex digest of a file's contents."""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def is_validated(model_path):
+    """True if validate() has passed for this exact model file."""
+    try:
+        with open(validation_record_path(model_path), "r") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return bool(record.get("passed")) and record.get("model_sha1") == _file_sha1(model_path)
+
+class OnnxRecognizer:
+    def __init__(self, model_path, char_dict_path, intra_op_threads=4, inter_op_threads=1, batch_size=6):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The onnx OCR backend requires onnxruntime (pip install onnxruntime).")
+        if not os.path.exists(model_path):
+            raise IOError(f"ONNX recognizer model not found at {model_path}; "
+                          f"create it with 'python ocr_onnx.py export'.")
+        if not os.path.exists(char_dict_path):
+            raise IOError(f"Recognizer character dictionary not found at {char_dict_path}")
+        if not is_validated(model_path):
+            print(f"Warning: {model_path} has not passed validation against the stock recognizer; "
+                  f"run 'python ocr_onnx.py validate CELLS_DIR'.")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        # Exported models may have a fixed input width instead of a dynamic one.
+        input_width = self.session.get_inputs()[0].shape[3]
+        self.fixed_width = input_width if isinstance(input_width, int) and input_width > 0 else None
+        self.batch_size = batch_size
+
+        # Same character table as PaddleOCR's CTCLabelDecode: blank, dictionary, space.
+        with open(char_dict_path, "r", encoding="utf-8") as f:
+            characters = [line.rstrip("\r\n") for line in f]
+        self.characters = np.array(["blank"] + characters + [" "], dtype=object)
+
+    def _resize_norm(self, image, image_width):
+        """Resizes to the model height, normalizes to [-1, 1] and right-pads to image_width."""
+        channels, height, _ = REC_IMAGE_SHAPE
+        h, w = image.shape[:2]
+        resized_w = min(image_width, int(math.ceil(height * w / float(h))))
+        resized = cv2.resize(image, (resized_w, height)).astype(np.float32)
+        resized = (resized.transpose((2, 0, 1)) / 255.0 - 0.5) / 0.5
+        padded = np.zeros((channels, height, image_width), dtype=np.float32)
+        padded[:, :, :resized_w] = resized
+        return padded
+
+    def _decode(self, probs):
+        """Greedy CTC decoding: best class per step, collapse repeats, drop blanks."""
+        indices = probs.argmax(axis=2)
+        keep = indices != 0
+        keep[:, 1:] &= indices[:, 1:] != indices[:, :-1]
+        return ["".join(self.characters[row[mask]]) for row, mask in zip(indices, keep)]
+
+    def recognize(self, images):
+        """Recognizes grayscale cell images and returns their texts, in input order."""
+        _, height, min_width = REC_IMAGE_SHAPE
+        bgr_images = [cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) for image in images]
+        # Batch images of similar aspect ratio together to minimize padding.
+        order = np.argsort([image.shape[1] / float(image.shape[0]) for image in bgr_images])
+        texts = [""] * len(bgr_images)
+        for start in range(0, len(order), self.batch_size):
+            batch_ids = order[start:start + self.batch_size]
+            if self.fixed_width:
+                image_width = self.fixed_width
+            else:
+                max_ratio = max(min_width / float(height),
+                                max(bgr_images[k].shape[1] / float(bgr_images[k].shape[0]) for k in batch_ids))
+                image_width = int(height * max_ratio)
+            batch = np.stack([self._resize_norm(bgr_images[k], image_width) for k in batch_ids])
+            probs = self.session.run(None, {self.input_name: batch})[0]
+            for k, text in zip(batch_ids, self._decode(probs)):
+                texts[k] = text
+        return texts
+
+def export_model(paddle_model_dir, output_path, int8=False, opset_version=11):
+    """
+    Converts a PaddleOCR recognition inference model to ONNX with paddle2onnx,
+    optionally quantizes its weights to int8, and copies the English character
+    dictionary next to it.
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+    float_path = output_path + ".fp32.onnx" if int8 else output_path
+    subprocess.run(["paddle2onnx",
+                    "--model_dir", paddle_model_dir,
+                    "--model_filename", "inference.pdmodel",
+                    "--params_filename", "inference.pdiparams",
+                    "--save_file", float_path,
+                    "--opset_version", str(opset_version)], check=True)
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(float_path, output_path, weight_type=QuantType.QInt8)
+        os.remove(float_path)
+
+    import paddleocr
+    char_dict = os.path.join(os.path.dirname(paddleocr.__file__), "ppocr", "utils", "en_dict.txt")
+    shutil.copy(char_dict, os.path.join(output_dir, "en_dict.txt"))
+    print(f"ONNX recognizer saved to {output_path}")
+
+def validate(cells_dir, config, min_agreement=0.99):
+    """
+    Recognizes every cell image in cells_dir with the stock PaddleOCR recognizer
+    and with the onnx backend, prints the cells where they disagree, records
+    the result next to the model (see validation_record_path), and returns
+    the fraction of cells on which they agree.
+    """
+    from ocr_paddle import recognize_images, ocr_settings
+
+    names = sorted(name for name in os.listdir(cells_dir) if name.endswith(".png"))
+    images = [cv2.imread(os.path.join(cells_dir, name), cv2.IMREAD_GRAYSCALE) for name in names]
+    stock = recognize_images(images, dict(config, ocr_backend="paddle"))
+    onnx = recognize_images(images, dict(config, ocr_backend="onnx"))
+
+    mismatches = [(name, a, b) for name, a, b in zip(names, stock, onnx) if a != b]
+    for name, a, b in mismatches:
+        print(f"{name}: stock={a!r} onnx={b!r}")
+    agreement = 1.0 - len(mismatches) / len(names) if names else 1.0
+    passed = agreement >= min_agreement
+    print(f"{'OK' if passed else 'FAILED'}: onnx backend agrees with the stock recognizer "
+          f"on {agreement:.2%} of {len(names)} cells (required {min_agreement:.2%}).")
+
+    model_path = ocr_settings(config)["ocr_onnx_model"]
+    with open(validation_record_path(model_path), "w") as f:
+        json.dump({
+            "model_sha1": _file_sha1(model_path),
+            "cells_dir": os.path.abspath(cells_dir),
+            "cells": len(names),
+            "mismatches": len(mismatches),
+            "agreement": agreement,
+            "min_agreement": min_agreement,
+            "passed": passed,
+            "validated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }, f, indent=2)
+    return agreement
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX Runtime CPU backend for the cell recognizer.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Convert a PaddleOCR rec model to ONNX.")
+    export_parser.add_argument("paddle_model_dir", help="Folder with inference.pdmodel/inference.pdiparams.")
+    export_parser.add_argument("--output", default=os.path.join("models", "en_rec_int8.onnx"))
+    export_parser.add_argument("--int8", action="store_true", help="Quantize weights to int8.")
+
+    validate_parser = subparsers.add_parser("validate", help="Compare against the stock recognizer.")
+    validate_parser.add_argument("cells_dir")
+    validate_parser.add_argument("--config", default="config.json")
+    validate_parser.add_argument("--min-agreement", type=float, default=0.99)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_model(args.paddle_model_dir, args.output, int8=args.int8)
+    else:
+        with open(args.config, "r") as f:
+            config = json.load(f)
+        if validate(args.cells_dir, config, min_agreement=args.min_agreement) < args.min_agreement:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
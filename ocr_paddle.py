@@ -1,93 +1,123 @@
 import os
 import json
 import csv
+import tempfile
+import threading
 import cv2
-from paddleocr import PaddleOCR
 
-def perform_ocr(config_path="config.json",
-                cells_output_dir=os.path.join('output', 'cells'),
-                csv_output_path=os.path.join('output', 'table_data.csv')):
+from ocr_service import OCRServiceClient, OCRServiceMismatch
+
+# Recognizer settings read from config.json, with their defaults.
+OCR_SETTINGS_DEFAULTS = {
+    "ocr_backend": "paddle",    # recognizer implementation: "paddle" or "onnx" (see ocr_onnx.py)
+    "ocr_use_gpu": True,        # run paddle on the GPU when one is available
+    "ocr_cpu_threads": 10,      # math library / intra-op threads when running on the CPU
+    "ocr_inter_op_threads": 1,  # onnx only: threads running independent graph nodes
+    "ocr_batch_size": 6,        # cell images per recognizer forward pass
+    "ocr_onnx_model": os.path.join("models", "en_rec_int8.onnx"),
+    "ocr_onnx_char_dict": os.path.join("models", "en_dict.txt"),
+}
+
+# The settings each backend actually reads. Engines are cached, and the OCR
+# service compares clients, on these keys only.
+BACKEND_SETTINGS = {
+    "paddle": ("ocr_backend", "ocr_use_gpu", "ocr_cpu_threads", "ocr_batch_size"),
+    "onnx": ("ocr_backend", "ocr_cpu_threads", "ocr_inter_op_threads", "ocr_batch_size",
+             "ocr_onnx_model", "ocr_onnx_char_dict"),
+}
+
+# Engines are shared by every perform_ocr call in the process, one per
+# distinct settings. The predictors are not thread-safe, so recognition
+# calls hold _ocr_lock.
+_ocr_engines = {}
+_ocr_lock = threading.Lock()
+
+def ocr_settings(config):
+    """Returns the recognizer settings from config, filling in defaults."""
+    return {key: config.get(key, default) for key, default in OCR_SETTINGS_DEFAULTS.items()}
+
+def recognizer_settings(config):
+    """Returns the recognizer settings the configured backend uses (see BACKEND_SETTINGS)."""
+    settings = ocr_settings(config)
+    keys = BACKEND_SETTINGS.get(settings["ocr_backend"], tuple(settings))
+    return {key: settings[key] for key in keys}
+
+def get_ocr_engine(config=None):
+    """Returns the process-wide OCR engine for config's settings, creating it on first use."""
+    settings = ocr_settings(config or {})
+    key = tuple(sorted(recognizer_settings(config or {}).items()))
+    with _ocr_lock:
+        engine = _ocr_engines.get(key)
+        if engine is None:
+            if settings["ocr_backend"] == "onnx":
+                from ocr_onnx import OnnxRecognizer
+                engine = OnnxRecognizer(settings["ocr_onnx_model"], settings["ocr_onnx_char_dict"],
+                                        intra_op_threads=settings["ocr_cpu_threads"],
+                                        inter_op_threads=settings["ocr_inter_op_threads"],
+                                        batch_size=settings["ocr_batch_size"])
+            elif settings["ocr_backend"] == "paddle":
+                # Imported here so processes that only talk to the OCR service
+                # do not pay for loading paddle.
+                from paddleocr import PaddleOCR
+                engine = PaddleOCR(use_angle_cls=False, lang='en',
+                                   use_gpu=settings["ocr_use_gpu"],
+                                   cpu_threads=settings["ocr_cpu_threads"],
+                                   rec_batch_num=settings["ocr_batch_size"])
+            else:
+                raise ValueError(f"Unknown OCR backend: {settings['ocr_backend']}")
+            _ocr_engines[key] = engine
+    return engine
+
+def recognize_images(images, config=None):
     """
-    Loops over the cells folder, performs OCR on non-title cells,
-    post-processes the numeric values, applies sign corrections, and
-    writes the complete table (including the title row and column) to a CSV.
-      
-    Post-processing:
-      1. Decimal formatting:
-         - For most cells: remove any existing decimal point and then insert a new decimal point
-           two characters from the end (to yield two-decimal precision).
-         - Exception: cells at (row 10, col 1) and (row 29, col 1) are left unmodified.
-         - Exception: cells in columns 4, 7, and 8 (1-indexed) are percent values and should have
-           no decimals (simply remove any periods).
-      
-      2. Sign correction for signed-data:
-         - For column 2 (i.e. CSV index 2): examine the corresponding cell in column 4 (index 4);
-           if that value is >= 100, prefix a '+' to the cell in column 2; otherwise, prefix a '-'.
-         - For column 6 (index 6): examine the corresponding cell in column 7 (index 7);
-           if that value is >= 100, prefix a '+'; else, '-'.
-         - For column 8 (index 8): compare the values in column 5 (index 5) and column 1 (index 1);
-           if (value in col5 - value in col1) is >= 0, prefix a '+', else prefix a '-'.
+    Recognizes a list of grayscale cell images in-process and returns their texts.
+    The whole list goes through the recognizer in one call so it can batch them.
     """
-    # Load configuration.
-    with open(config_path, "r") as f:
-        config = json.load(f)
-    
-    total_rows = config.get("num_rows", 0)         # Total rows (including title row)
-    total_columns = config.get("num_columns", 0)     # Total columns (including title column)
-    column_titles = config.get("column_titles", [])
-    row_titles = config.get("row_titles", [])
-    
-    # Initialize OCR engine.
-    ocr = PaddleOCR(use_angle_cls=False, lang='en', use_gpu=True)
-    
-    # Prepare CSV data as a 2D list.
-    # First row: use the column_titles list.
-    csv_data = [column_titles]
-    
-    # Process each non-title row.
-    for i in range(1, total_rows):
-        row_data = []
-        # First cell of each row: row title.
-        row_data.append(row_titles[i] if i < len(row_titles) else "")
-        # Process OCR for each non-title cell.
-        for j in range(1, total_columns):
-            cell_filename = f"cell_row{i}_col{j}.png"
-            cell_path = os.path.join(cells_output_dir, cell_filename)
-            cell_image = cv2.imread(cell_path, cv2.IMREAD_GRAYSCALE)
-            if cell_image is None:
-                print(f"Warning: Cell image not found at {cell_path}")
-                row_data.append("")
-                continue
-            result = ocr.ocr(cell_image, det=False, cls=False)
-            text = result[0][0][0] if result and len(result) > 0 else ""
-            
-            # --- Decimal post-processing ---
-            # Exceptions: do not modify cell if it is at (row 10, col 1) or (row 29, col 1)
-            # (Note: i and j are the grid indices where i>=1 and j>=1)
-            if text != "":
-                if (i == 10 and j == 1) or (i == 29 and j == 1):
-                    processed = text
-                # For percent-value cells (columns 4, 7, 8; i.e. j in {4, 7, 8}), remove any decimals.
-                elif j in {4, 7, 8}:
-                    processed = text.replace('.', '')
-                else:
-                    # Remove any existing decimal point.
-                    digits = text.replace('.', '')
-                    # Ensure there are at least three digits to allow a decimal insertion.
-                    if len(digits) < 3:
-                        digits = digits.zfill(3)
-                    processed = digits[:-2] + '.' + digits[-2:]
-            else:
-                processed = ""
-            row_data.append(processed)
-        csv_data.append(row_data)
-    
-    # --- Sign correction ---
-    # The signed-data columns are 2, 6, 8 (1-indexed), which correspond to indices 2, 6, 8 in each data row.
-    # Process each data row (skip header row).
-    for r in range(1, len(csv_data)):
-        row = csv_data[r]
-        # For column 2: check column 4.
+    if not images:
+        return []
+    ocr = get_ocr_engine(config)
+    if ocr_settings(config or {})["ocr_backend"] == "onnx":
+        # ONNX Runtime sessions can be run from several threads at once.
+        return ocr.recognize(images)
+    bgr_images = [cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) for image in images]
+    with _ocr_lock:
+        rec_res, _ = ocr.text_recognizer(bgr_images)
+    return [text for text, _score in rec_res]
+
+def recognize_with_fallback(images, config):
+    """
+    Recognizes images through the local OCR service if it is enabled (see
+    ocr_service.py). Falls back to in-process OCR only when nothing is
+    listening or the service runs different recognizer settings (e.g. it runs
+    paddle while config selects the onnx backend); a busy or slow service
+    raises instead, so clients do not each load their own model while the
+    shared one is under load.
+    """
+    if images and config.get("use_ocr_service", False):
+        settings = recognizer_settings(config)
+        try:
+            return OCRServiceClient.from_config(config).recognize(images, settings)
+        except (ConnectionRefusedError, FileNotFoundError) as e:
+            print(f"OCR service not running ({e}); using in-process OCR.")
+        except OCRServiceMismatch as e:
+            print(f"{e}, not the configured {settings['ocr_backend']} recognizer; using in-process OCR.")
+    return recognize_images(images, config)
+
+# Signed-data columns and the columns their sign is derived from (CSV indices).
+SIGN_DEPENDENCIES = {
+    2: (2, 4),
+    6: (6, 7),
+    8: (8, 1, 5),
+}
+
+def apply_sign_corrections(row, columns=(2, 6, 8)):
+    """
+    Restores the signs of the given signed-data columns (2, 6 and/or 8) of one
+    CSV data row in place (see perform_ocr for the rules). Cells that are
+    empty or not numeric are left as they are.
+    """
+    # For column 2: check column 4.
+    if 2 in columns:
         try:
             cell_val = row[2]
             ref_val = row[4]
@@ -102,8 +132,9 @@ def perform_ocr(config_path="config.json",
                     row[2] = f"-{num_cell:.2f}"
         except Exception:
             pass
-        
-        # For column 6: check column 7.
+    
+    # For column 6: check column 7.
+    if 6 in columns:
         try:
             cell_val = row[6]
             ref_val = row[7]
@@ -117,8 +148,9 @@ def perform_ocr(config_path="config.json",
                     row[6] = f"-{num_cell:.2f}"
         except Exception:
             pass
-        
-        # For column 8: compare column 5 and column 1.
+    
+    # For column 8: compare column 5 and column 1.
+    if 8 in columns:
         try:
             cell_val = row[8]
             pre_val = row[1]
@@ -135,10 +167,138 @@ def perform_ocr(config_path="config.json",
         except Exception:
             pass
 
-    # Write the complete CSV data to file.
-    with open(csv_output_path, "w", newline="", encoding="utf-8") as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerows(csv_data)
+def ocr_table_rows(config, cells_output_dir, rows=None):
+    """
+    Performs OCR on the non-title cells of the given grid rows (all rows if None),
+    post-processes the numeric values and applies sign corrections.
+    Returns {row_index: row_data}, where row_data starts with the row title.
+    Sign correction only looks at cells of the same row, so any subset of
+    rows can be recognized independently.
+    """
+    total_rows = config.get("num_rows", 0)         # Total rows (including title row)
+    total_columns = config.get("num_columns", 0)     # Total columns (including title column)
+    row_titles = config.get("row_titles", [])
+    if rows is None:
+        rows = range(1, total_rows)
+    
+    # Load every requested non-title cell, then recognize them all in one batch.
+    cell_keys = []
+    cell_images = []
+    for i in rows:
+        for j in range(1, total_columns):
+            cell_filename = f"cell_row{i}_col{j}.png"
+            cell_path = os.path.join(cells_output_dir, cell_filename)
+            cell_image = cv2.imread(cell_path, cv2.IMREAD_GRAYSCALE)
+            if cell_image is None:
+                print(f"Warning: Cell image not found at {cell_path}")
+                continue
+            cell_keys.append((i, j))
+            cell_images.append(cell_image)
+    texts = dict(zip(cell_keys, recognize_with_fallback(cell_images, config)))
+    
+    rows_data = {}
+    for i in rows:
+        row_data = []
+        # First cell of each row: row title.
+        row_data.append(row_titles[i] if i < len(row_titles) else "")
+        # Post-process the OCR text of each non-title cell.
+        for j in range(1, total_columns):
+            if (i, j) not in texts:
+                row_data.append("")
+                continue
+            text = texts[(i, j)]
+            
+            # --- Decimal post-processing ---
+            # Exceptions: do not modify cell if it is at (row 10, col 1) or (row 29, col 1)
+            # (Note: i and j are the grid indices where i>=1 and j>=1)
+            if text != "":
+                if (i == 10 and j == 1) or (i == 29 and j == 1):
+                    processed = text
+                # For percent-value cells (columns 4, 7, 8; i.e. j in {4, 7, 8}), remove any decimals.
+                elif j in {4, 7, 8}:
+                    processed = text.replace('.', '')
+                else:
+                    # Remove any existing decimal point.
+                    digits = text.replace('.', '')
+                    # Ensure there are at least three digits to allow a decimal insertion.
+                    if len(digits) < 3:
+                        digits = digits.zfill(3)
+                    processed = digits[:-2] + '.' + digits[-2:]
+            else:
+                processed = ""
+            row_data.append(processed)
+        apply_sign_corrections(row_data)
+        rows_data[i] = row_data
+    return rows_data
+
+def build_table_csv(config, rows_data):
+    """
+    Assembles the CSV table: the column_titles row, then one row per grid row.
+    Rows missing from rows_data (not OCR'd yet) hold only their row title.
+    """
+    total_rows = config.get("num_rows", 0)
+    total_columns = config.get("num_columns", 0)
+    row_titles = config.get("row_titles", [])
+    csv_data = [config.get("column_titles", [])]
+    for i in range(1, total_rows):
+        if i in rows_data:
+            csv_data.append(rows_data[i])
+        else:
+            csv_data.append([row_titles[i] if i < len(row_titles) else ""] + [""] * (total_columns - 1))
+    return csv_data
+
+def write_table_csv(csv_data, csv_output_path):
+    """
+    Writes the CSV data to file. The file is replaced in one step so readers
+    never see a partially written table; each write uses its own temporary
+    file, so concurrent writers cannot interleave.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(csv_output_path)),
+                                    prefix=os.path.basename(csv_output_path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerows(csv_data)
+        os.replace(tmp_path, csv_output_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return csv_output_path
+
+def perform_ocr(config_path="config.json",
+                cells_output_dir=os.path.join('output', 'cells'),
+                csv_output_path=os.path.join('output', 'table_data.csv'),
+                rows=None):
+    """
+    Loops over the cells folder, performs OCR on non-title cells (through the
+    local OCR service when it is running, otherwise in-process),
+    post-processes the numeric values, applies sign corrections, and
+    writes the complete table (including the title row and column) to a CSV.
+    If rows is given, only those grid rows are recognized; the others are
+    written with their row title and empty cells.
+      
+    Post-processing:
+      1. Decimal formatting:
+         - For most cells: remove any existing decimal point and then insert a new decimal point
+           two characters from the end (to yield two-decimal precision).
+         - Exception: cells at (row 10, col 1) and (row 29, col 1) are left unmodified.
+         - Exception: cells in columns 4, 7, and 8 (1-indexed) are percent values and should have
+           no decimals (simply remove any periods).
+      
+      2. Sign correction for signed-data:
+         - For column 2 (i.e. CSV index 2): examine the corresponding cell in column 4 (index 4);
+           if that value is >= 100, prefix a '+' to the cell in column 2; otherwise, prefix a '-'.
+         - For column 6 (index 6): examine the corresponding cell in column 7 (index 7);
+           if that value is >= 100, prefix a '+'; else, '-'.
+         - For column 8 (index 8): compare the values in column 5 (index 5) and column 1 (index 1);
+           if (value in col5 - value in col1) is >= 0, prefix a '+', else prefix a '-'.
+    """
+    # Load configuration.
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    
+    rows_data = ocr_table_rows(config, cells_output_dir, rows)
+    write_table_csv(build_table_csv(config, rows_data), csv_output_path)
     
     print(f"OCR results with post-processing, sign corrections, and titles saved to {csv_output_path}")
     return csv_output_path
@@ -0,0 +1,343 @@
+"""
+Local OCR service shared by several table_app instances on the same machine.
+
+The service keeps one warm recognizer in memory and answers recognition
+requests over localhost TCP (or a Unix socket where available). Requests
+from concurrent clients are merged into larger recognizer batches, and the
+number of pending requests is bounded: when the queue stays full, clients
+are told the service is busy and back off.
+
+Run it with:
+    python ocr_service.py [--host 127.0.0.1] [--port 8765] [--unix-socket PATH]
+
+perform_ocr uses OCRServiceClient when "use_ocr_service" is true in
+config.json. On each connection the client first pings the service for its
+recognizer settings (the ocr_* keys its backend uses) and runs OCR
+in-process if they differ from its own, without uploading the images; the
+service also rejects recognize requests carrying different settings. The
+client also falls back to in-process OCR if nothing is listening. A busy
+service is never a reason to fall back: the client backs off and retries,
+and raises OCRServiceBusy if the service stays saturated.
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Each message is: 8-byte little-endian (header length, payload length),
+# a JSON header, then the raw payload bytes.
+_FRAME = struct.Struct("<II")
+
+class OCRServiceError(Exception):
+    """Raised when the OCR service answers with an error."""
+
+class OCRServiceBusy(OCRServiceError):
+    """Raised when the OCR service keeps rejecting requests because its queue is full."""
+
+class OCRServiceMismatch(OCRServiceError):
+    """Raised when the OCR service runs a different recognizer than the client asked for."""
+
+##############################################################################
+# Wire protocol
+##############################################################################
+def _recv_exact(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def send_message(sock, header, payload=b""):
+    """Sends a JSON header and an optional binary payload as one frame."""
+    header_bytes = json.dumps(header).encode("utf-8")
+    sock.sendall(_FRAME.pack(len(header_bytes), len(payload)) + header_bytes + payload)
+
+def recv_message(sock):
+    """Receives one frame and returns (header, payload)."""
+    header_len, payload_len = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    header = json.loads(_recv_exact(sock, header_len).decode("utf-8"))
+    payload = _recv_exact(sock, payload_len) if payload_len else b""
+    return header, payload
+
+def encode_images(images):
+    """Packs grayscale uint8 images into (shapes, payload)."""
+    shapes = [list(image.shape[:2]) for image in images]
+    payload = b"".join(np.ascontiguousarray(image, dtype=np.uint8).tobytes() for image in images)
+    return shapes, payload
+
+def decode_images(shapes, payload):
+    """Inverse of encode_images."""
+    buffer = np.frombuffer(payload, dtype=np.uint8)
+    images = []
+    offset = 0
+    for height, width in shapes:
+        size = height * width
+        images.append(buffer[offset:offset + size].reshape(height, width))
+        offset += size
+    return images
+
+##############################################################################
+# Client
+##############################################################################
+class OCRServiceClient:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None,
+                 connect_timeout=0.5, timeout=60.0, busy_retries=5, busy_backoff=0.2):
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.busy_retries = busy_retries
+        self.busy_backoff = busy_backoff
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds a client from the ocr_service_* keys of config.json."""
+        return cls(host=config.get("ocr_service_host", DEFAULT_HOST),
+                   port=config.get("ocr_service_port", DEFAULT_PORT),
+                   unix_socket=config.get("ocr_service_socket") or None)
+
+    def _connect(self):
+        if self.unix_socket:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = self.unix_socket
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = (self.host, self.port)
+        sock.settimeout(self.connect_timeout)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(self.timeout)
+        return sock
+
+    def _check_settings(self, sock, settings):
+        """Raises OCRServiceMismatch if the service runs other recognizer settings."""
+        send_message(sock, {"op": "ping"})
+        header, _ = recv_message(sock)
+        service_settings = header.get("settings")
+        if service_settings is not None and service_settings != json.loads(json.dumps(settings)):
+            raise OCRServiceMismatch(f"OCR service runs {service_settings}")
+
+    def recognize(self, images, settings=None):
+        """
+        Sends grayscale cell images to the service and returns their texts.
+        settings are the recognizer settings the client expects (see
+        ocr_paddle.recognizer_settings); if the service reports different
+        ones when pinged, OCRServiceMismatch is raised before the images are
+        sent.
+        A busy reply or a connection attempt that times out (the service's
+        listen backlog is full) is retried with exponential backoff.
+        Raises OSError if the service is not reachable and OCRServiceBusy if it
+        stays saturated after the configured retries.
+        """
+        if not images:
+            return []
+        shapes, payload = encode_images(images)
+        request = {"op": "recognize", "shapes": shapes}
+        if settings is not None:
+            request["settings"] = settings
+        sock = None
+        try:
+            for attempt in range(self.busy_retries + 1):
+                if sock is None:
+                    try:
+                        sock = self._connect()
+                    except socket.timeout:
+                        time.sleep(self.busy_backoff * (2 ** attempt))
+                        continue
+                    if settings is not None:
+                        self._check_settings(sock, settings)
+                send_message(sock, request, payload)
+                header, _ = recv_message(sock)
+                if header.get("error") == "busy":
+                    time.sleep(self.busy_backoff * (2 ** attempt))
+                    continue
+                if header.get("error") == "settings_mismatch":
+                    raise OCRServiceMismatch(f"OCR service runs {header.get('settings')}")
+                if "error" in header:
+                    raise OCRServiceError(header["error"])
+                return header["texts"]
+        finally:
+            if sock is not None:
+                sock.close()
+        raise OCRServiceBusy("OCR service queue is full")
+
+##############################################################################
+# Server
+##############################################################################
+class _PendingRequest:
+    def __init__(self, images):
+        self.images = images
+        self.texts = None
+        self.error = None
+        self.done = threading.Event()
+
+class OCRService:
+    """
+    Batches recognition requests from many connections onto one recognizer.
+
+    recognize is a callable taking a list of grayscale images and returning
+    their texts (ocr_paddle.recognize_images by default). At most max_pending
+    requests wait in the queue; a request that cannot be queued within
+    enqueue_timeout seconds is rejected as busy. The worker merges queued
+    requests until it has max_batch images or batch_wait seconds have passed.
+    """
+    def __init__(self, recognize, max_batch=256, max_pending=32, batch_wait=0.005, enqueue_timeout=2.0):
+        self.recognize = recognize
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._worker = threading.Thread(target=self._run, name="ocr-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, images):
+        """Queues images and blocks until their texts are ready. Raises queue.Full when busy."""
+        request = _PendingRequest(images)
+        self._queue.put(request, timeout=self.enqueue_timeout)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.texts
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        count = len(batch[0].images)
+        deadline = time.monotonic() + self.batch_wait
+        while count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            count += len(request.images)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            images = [image for request in batch for image in request.images]
+            try:
+                texts = self.recognize(images)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+            offset = 0
+            for request in batch:
+                request.texts = texts[offset:offset + len(request.images)]
+                offset += len(request.images)
+                request.done.set()
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        service = self.server.ocr_service
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+            except (ConnectionError, OSError, struct.error):
+                return
+            op = header.get("op")
+            if op == "ping":
+                send_message(self.request, {"ok": True, "settings": self.server.ocr_settings})
+            elif op == "recognize":
+                requested = header.get("settings")
+                if requested is not None and self.server.ocr_settings is not None \
+                        and requested != self.server.ocr_settings:
+                    send_message(self.request, {"error": "settings_mismatch",
+                                                "settings": self.server.ocr_settings})
+                    continue
+                try:
+                    texts = service.submit(decode_images(header["shapes"], payload))
+                    send_message(self.request, {"texts": texts})
+                except queue.Full:
+                    send_message(self.request, {"error": "busy"})
+                except Exception as e:
+                    send_message(self.request, {"error": str(e)})
+            else:
+                send_message(self.request, {"error": f"unknown op {op!r}"})
+
+# Listen backlog: many clients connecting at once must queue in the kernel
+# rather than have their connection attempts dropped.
+REQUEST_QUEUE_SIZE = 128
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+        request_queue_size = REQUEST_QUEUE_SIZE
+
+def serve(recognize, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None, settings=None, **service_options):
+    """
+    Starts the OCR service and blocks serving requests until interrupted.
+    settings describe the recognizer behind recognize; requests asking for
+    different settings are rejected. None accepts every request.
+    """
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = _UnixServer(unix_socket, _RequestHandler)
+        address = unix_socket
+    else:
+        server = _TCPServer((host, port), _RequestHandler)
+        address = f"{host}:{port}"
+    server.ocr_service = OCRService(recognize, **service_options)
+    # Round-trip through JSON so the comparison matches what clients send.
+    server.ocr_settings = json.loads(json.dumps(settings)) if settings is not None else None
+    print(f"OCR service listening on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared local OCR service for table_app.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix-socket", default=None, help="Listen on a Unix socket instead of TCP.")
+    parser.add_argument("--max-batch", type=int, default=256, help="Max images per recognizer batch.")
+    parser.add_argument("--config", default="config.json", help="Recognizer settings (ocr_* keys).")
+    parser.add_argument("--max-pending", type=int, default=32, help="Max queued requests before clients are told to back off.")
+    args = parser.parse_args()
+
+    # Load the model before accepting connections so the first client is not slowed down.
+    from ocr_paddle import get_ocr_engine, recognize_images, recognizer_settings
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, "r") as f:
+            config = json.load(f)
+    get_ocr_engine(config)
+    serve(lambda images: recognize_images(images, config), host=args.host, port=args.port,
+          unix_socket=args.unix_socket, settings=recognizer_settings(config),
+          max_batch=args.max_batch, max_pending=args.max_pending)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from table_detector import detect_tables
+from cell_segmentation import segment_cells
+from ocr_paddle import perform_ocr, ocr_table_rows, build_table_csv, write_table_csv
+from interpretation import interpret_pft, INTERPRETATION_ROWS
+
+def priority_rows(config_data):
+    """
+    Splits the grid rows into (rows the interpretation reads, all other rows),
+    matching INTERPRETATION_ROWS against the configured row titles.
+    """
+    row_titles = config_data.get("row_titles", [])
+    first, rest = [], []
+    for i in range(1, config_data.get("num_rows", 0)):
+        title = row_titles[i] if i < len(row_titles) else ""
+        (first if title in INTERPRETATION_ROWS else rest).append(i)
+    return first, rest
+
+def start_table(config_data, cropped_table_path, config_path="config.json", on_interpretation=None):
+    """
+    First phase of process_table: segmentation, OCR of the rows the
+    interpretation needs and the interpretation itself.
+    Returns (result, rows_data, remaining_rows); finish_table OCRs
+    remaining_rows and writes the full CSV. Without "ocr_priority_mode" the
+    whole table is OCR'd here and remaining_rows is empty.
+    """
+    table_dir = os.path.dirname(cropped_table_path)
+    cells_output_dir = os.path.join(table_dir, "cells")
+    csv_output_path = os.path.join(table_dir, "table_data.csv")
+
+    segment_cells(config_data, cropped_table_path=cropped_table_path, cells_output_dir=cells_output_dir)
+    result = {"table_dir": table_dir, "csv_path": csv_output_path}
+
+    if config_data.get("ocr_priority_mode", False):
+        first, rest = priority_rows(config_data)
+        rows_data = ocr_table_rows(config_data, cells_output_dir, first)
+        write_table_csv(build_table_csv(config_data, rows_data), csv_output_path)
+    else:
+        perform_ocr(config_path=config_path, cells_output_dir=cells_output_dir, csv_output_path=csv_output_path)
+        rows_data, rest = None, []
+    result["interpretation"] = interpret_pft(csv_output_path)
+    if on_interpretation is not None:
+        on_interpretation(dict(result))
+    return result, rows_data, rest
+
+def finish_table(config_data, result, rows_data, remaining_rows):
+    """Second phase of process_table: OCRs the remaining rows and writes the full CSV."""
+    if remaining_rows:
+        cells_output_dir = os.path.join(result["table_dir"], "cells")
+        rows_data.update(ocr_table_rows(config_data, cells_output_dir, remaining_rows))
+        write_table_csv(build_table_csv(config_data, rows_data), result["csv_path"])
+    return result
+
+def process_table(config_data, cropped_table_path, config_path="config.json", on_interpretation=None):
+    """
+    Runs segmentation, OCR and interpretation for one cropped table.
+    Cells and table_data.csv are written next to cropped_table_path.
+    Returns a dict with the table directory, CSV path and interpretation text.
+
+    on_interpretation, if given, is called with that dict as soon as the
+    interpretation is known. With "ocr_priority_mode" set in the config, the
+    rows in INTERPRETATION_ROWS are OCR'd first, the interpretation is
+    reported from them (with a partial table_data.csv), and only then are
+    the remaining rows OCR'd and the full CSV written.
+    """
+    return finish_table(config_data, *start_table(config_data, cropped_table_path, config_path, on_interpretation))
+
+def process_screenshot(template_path, target_path, output_dir="output", config_path="config.json",
+                       threshold=0.2, max_workers=None, on_interpretation=None, on_table=None):
+    """
+    Detects every table in target_path and processes each one concurrently
+    through segmentation, OCR and interpretation.
+    Returns one result dict per detected table (see process_table), in
+    reading order; an empty list if no table was found. Each result also
+    carries its 1-based "index" and the total "count" of tables.
+
+    With "ocr_priority_mode" set, the tables are processed in two phases:
+    the interpretation rows of every table are OCR'd (and interpreted)
+    before the remaining rows of any table, so no interpretation waits
+    behind another table's bulk OCR on the shared recognizer.
+
+    on_interpretation and on_table are optional callbacks, called from the
+    worker threads with a table's result when its interpretation is ready
+    and when the whole table has been OCR'd, respectively.
+    """
+    cropped_paths = detect_tables(template_path, target_path, output_dir=output_dir, threshold=threshold)
+    if not cropped_paths:
+        return []
+
+    with open(config_path, "r") as f:
+        config_data = json.load(f)
+
+    def tag(index, result):
+        result.update(index=index, count=len(cropped_paths))
+        return result
+
+    def start(index, cropped_path):
+        interpretation_callback = None
+        if on_interpretation is not None:
+            interpretation_callback = lambda result: on_interpretation(tag(index, result))
+        result, rows_data, rest = start_table(config_data, cropped_path, config_path, interpretation_callback)
+        return tag(index, result), rows_data, rest
+
+    def finish(result, rows_data, rest):
+        finish_table(config_data, result, rows_data, rest)
+        if on_table is not None:
+            on_table(result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(cropped_paths)) as pool:
+        if config_data.get("ocr_priority_mode", False):
+            started = [future.result() for future in
+                       [pool.submit(start, k, path) for k, path in enumerate(cropped_paths, start=1)]]
+            futures = [pool.submit(finish, *state) for state in started]
+        else:
+            futures = [pool.submit(lambda k, path: finish(*start(k, path)), k, path)
+                       for k, path in enumerate(cropped_paths, start=1)]
+        return [future.result() for future in futures]
@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+
+# Chain used when config.json has no "preprocessing" entry. Grayscale matches
+# what perform_ocr reads, so the cells it loads are unchanged.
+DEFAULT_PREPROCESSING = ["grayscale"]
+
+def _to_gray(image):
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+def grayscale(image):
+    """Converts a BGR image to single-channel grayscale."""
+    return _to_gray(image)
+
+def normalize(image, method="minmax", clip_limit=2.0, tile_size=8):
+    """
+    Stretches contrast over the full 0-255 range ("minmax"), or applies
+    local histogram equalization ("clahe", grayscale only).
+    """
+    if method == "clahe":
+        clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_size, tile_size))
+        return clahe.apply(_to_gray(image))
+    return cv2.normalize(image, None, 0, 255, cv2.NORM_MINMAX)
+
+def denoise(image, method="median", ksize=3, h=10):
+    """Removes speckle noise with a median blur, or non-local means ("nlmeans")."""
+    if method == "nlmeans":
+        if image.ndim == 3:
+            return cv2.fastNlMeansDenoisingColored(image, None, h, h)
+        return cv2.fastNlMeansDenoising(image, None, h)
+    return cv2.medianBlur(image, ksize)
+
+def binarize(image, method="otsu", block_size=31, c=10):
+    """Thresholds to black and white with Otsu's method, or adaptively ("adaptive")."""
+    gray = _to_gray(image)
+    if method == "adaptive":
+        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                     cv2.THRESH_BINARY, block_size, c)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary
+
+def invert(image):
+    """Inverts pixel values (light text on dark background -> dark on light)."""
+    return cv2.bitwise_not(image)
+
+def scale(image, factor=2.0):
+    """Resizes the image by factor; upscaling small text can help recognition."""
+    interpolation = cv2.INTER_CUBIC if factor > 1 else cv2.INTER_AREA
+    return cv2.resize(image, None, fx=factor, fy=factor, interpolation=interpolation)
+
+PREPROCESSING_FILTERS = {
+    "grayscale": grayscale,
+    "normalize": normalize,
+    "denoise": denoise,
+    "binarize": binarize,
+    "invert": invert,
+    "scale": scale,
+}
+
+def preprocess_table(image, chain=None):
+    """
+    Runs a filter chain once over the whole cropped table image.
+
+    chain is a list whose entries are either a filter name, e.g. "grayscale",
+    or a dict with a "name" and that filter's keyword arguments, e.g.
+    {"name": "binarize", "method": "adaptive", "block_size": 25}.
+    Returns the processed image as a contiguous uint8 array.
+    """
+    if chain is None:
+        chain = DEFAULT_PREPROCESSING
+    for step in chain:
+        if isinstance(step, str):
+            name, params = step, {}
+        else:
+            params = dict(step)
+            name = params.pop("name")
+        if name not in PREPROCESSING_FILTERS:
+            raise ValueError(f"Unknown preprocessing filter: {name}")
+        image = PREPROCESSING_FILTERS[name](image, **params)
+    return np.ascontiguousarray(image, dtype=np.uint8)
@@ -5,12 +5,13 @@ import pyautogui
 import os
 import shutil
 import csv
+import queue
+import threading
 from PIL import Image, ImageTk
 
-from table_detector import detect_table 
-from cell_segmentation import segment_cells
-from ocr_paddle import perform_ocr  # Import the OCR function
-from interpretation import interpret_pft  # Import the interpretation function
+from table_detector import build_template_pyramid
+from pipeline import process_screenshot  # Detection, segmentation, OCR and interpretation
+from table_model import TableModel  # Editable in-memory results with incremental re-interpretation
 
 ##############################################################################
 # Utility to load/save config
@@ -57,16 +58,20 @@ class App:
         self.config_button = ttk.Button(master, text="Configure", command=self.configure_table)
         self.config_button.pack(pady=10)
 
+        # Pipeline results are passed from the worker thread to the Tk thread through this queue.
+        self.events = queue.Queue()
+        self.results_windows = {}
+
     def run_button_callback(self):
         """
         Full pipeline triggered by the Run button:
          1) Delete existing output folder and table_target.png.
          2) Screenshot the entire screen (saved as table_target.png).
-         3) Detect the table using the template (table_template.png).
-         4) Segment the cropped table into cells.
-         5) Run OCR on the segmented cells and generate CSV.
+         3) Detect every table matching the template (table_template.png).
+         4) Segment each cropped table into cells.
+         5) Run OCR on the segmented cells and generate one CSV per table.
          6) Interpret the OCR results.
-         7) Display the interpretation in a new window with a Copy button.
+         7) Display the results and interpretation of each table in new windows.
         """
         # 1) Clean up old files/folders.
         if os.path.exists("output"):
@@ -81,32 +86,70 @@ class App:
         screenshot.save("table_target.png")
         print("Screenshot saved to table_target.png")
 
-        # 3) Detect table.
-        success = detect_table("table_template.png", "table_target.png", output_dir="output", threshold=0.2)
-        if success:
-            print("Table detection successful. Cropped table saved.")
-        else:
-            messagebox.showerror("Error", "Table detection failed.")
-            return
-        
-        # 4) Segment cells.
-        config_data = load_config()
-        segment_cells(config_data, cropped_table_path="output/cropped_table.png")
-        print("Cell segmentation completed.")
+        # 3-6) Detect every table, then segment, OCR and interpret each one, in the background.
+        self.run_button.config(state="disabled")
+        self.results_windows = {}
+        threading.Thread(target=self.run_pipeline, daemon=True).start()
+        self.master.after(50, self.poll_events)
 
-        # 5) Run OCR.
-        ocr_csv_path = perform_ocr()
-        print(f"OCR completed. CSV saved at {ocr_csv_path}")
-        
-        ResultsWindow(self.master, ocr_csv_path)
-
-
-        # 6) Interpret the OCR results.
-        interpretation_text = interpret_pft(ocr_csv_path)
-        print("Interpretation complete.")
+    def run_pipeline(self):
+        """
+        Runs detection, segmentation, OCR and interpretation off the Tk thread.
+        Progress is reported through self.events and shown by poll_events.
+        """
+        try:
+            results = process_screenshot(
+                "table_template.png", "table_target.png", output_dir="output", threshold=0.2,
+                on_interpretation=lambda result: self.events.put(("interpretation", result)),
+                on_table=lambda result: self.events.put(("table", result)))
+            self.events.put(("done", results))
+        except Exception as e:
+            self.events.put(("error", e))
 
-        # 7) Display the interpretation.
-        InterpretationWindow(self.master, interpretation_text)
+    def poll_events(self):
+        """
+        7) Displays each table's interpretation as soon as it is ready (in
+        priority mode, before the remaining rows are OCR'd), and fills in its
+        results grid once the whole table is done.
+        """
+        while True:
+            try:
+                kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "interpretation":
+                suffix = f" (Table {payload['index']})" if payload["count"] > 1 else ""
+                interpretation_window = InterpretationWindow(
+                    self.master, payload["interpretation"], title="PFT Interpretation" + suffix)
+                self.results_windows[payload["index"]] = ResultsWindow(
+                    self.master, payload["csv_path"], title="OCR Results" + suffix,
+                    on_interpretation_change=interpretation_window.set_text, complete=False)
+            elif kind == "table":
+                self.results_windows[payload["index"]].load_csv(payload["csv_path"], complete=True)
+            elif kind == "done":
+                self.run_button.config(state="normal")
+                if not payload:
+                    messagebox.showerror("Error", "Table detection failed.")
+                else:
+                    print(f"Processed {len(payload)} table(s).")
+                return
+            elif kind == "error":
+                self.run_button.config(state="normal")
+                # The pipeline has stopped, so tables it did not finish will not
+                # get a "table" event; reload them as they are so edits are saved.
+                unfinished = sorted(index for index, window in self.results_windows.items()
+                                    if not window.complete)
+                for index in unfinished:
+                    window = self.results_windows[index]
+                    window.load_csv(window.csv_path, complete=True)
+                message = f"Processing failed: {payload}"
+                if unfinished:
+                    tables = ", ".join(str(index) for index in unfinished)
+                    message += (f"\n\nTable(s) {tables} were only partly OCR'd; their results show the "
+                                f"rows read so far, and your corrections to them are saved.")
+                messagebox.showerror("Error", message)
+                return
+        self.master.after(50, self.poll_events)
 
     def configure_table(self):
         """
@@ -294,14 +337,16 @@ class TableConfigWindow:
         config_data["num_rows"] = rows
         save_config(config_data)
         print("Configuration saved to config.json")
+        # Precompute the resized templates so Run does not redo it each time.
+        build_template_pyramid(self.image_path)
 
 ##############################################################################
 # Interpretation Window (Display OCR Interpretation)
 ##############################################################################
 class InterpretationWindow:
-    def __init__(self, master, interpretation_text):
+    def __init__(self, master, interpretation_text, title="PFT Interpretation"):
         self.win = tk.Toplevel(master)
-        self.win.title("PFT Interpretation")
+        self.win.title(title)
         self.win.geometry("600x400")
         
         # Create a Text widget with scrollbar.
@@ -323,6 +368,13 @@ class InterpretationWindow:
         copy_btn = ttk.Button(self.win, text="Copy Text", command=self.copy_text)
         copy_btn.pack(pady=5)
     
+    def set_text(self, interpretation_text):
+        """Replaces the displayed interpretation in place (e.g. after a cell is corrected)."""
+        self.text_box.config(state="normal")
+        self.text_box.delete("1.0", "end")
+        self.text_box.insert("1.0", interpretation_text)
+        self.text_box.config(state="disabled")
+    
     def copy_text(self):
         text = self.text_box.get("1.0", "end-1c")
         self.win.clipboard_clear()
@@ -330,9 +382,27 @@ class InterpretationWindow:
         messagebox.showinfo("Copied", "Interpretation text copied to clipboard.")
         
 class ResultsWindow:
-    def __init__(self, master, csv_path):
+    """
+    Shows the OCR results grid. Double-click a cell to correct it; the edit
+    goes into a TableModel, which re-applies the affected sign corrections
+    and recomputes only the affected interpretation sections. The new
+    interpretation is passed to on_interpretation_change and the corrected
+    table is written back to csv_path.
+
+    While complete is False the pipeline is still writing csv_path, so edits
+    are only kept in memory; they are written once load_csv is called with
+    the finished table and complete=True.
+    """
+    def __init__(self, master, csv_path, title="OCR Results", on_interpretation_change=None, complete=True):
+        self.csv_path = csv_path
+        self.on_interpretation_change = on_interpretation_change
+        self.complete = complete
+        self.model = None
+        self.items = []   # Treeview item id of each data row, in CSV order
+        self.edits = {}   # (row, column) -> value typed by the user, kept across reloads
+        self.editor = None
         self.win = tk.Toplevel(master)
-        self.win.title("OCR Results")
+        self.win.title(title)
         # Create a frame for the treeview and scrollbar.
         frame = tk.Frame(self.win)
         frame.pack(fill="both", expand=True)
@@ -345,7 +415,19 @@ class ResultsWindow:
         vsb = ttk.Scrollbar(frame, orient="vertical", command=self.tree.yview)
         vsb.pack(side="right", fill="y")
         self.tree.configure(yscrollcommand=vsb.set)
+        self.tree.bind("<Double-1>", self.begin_edit)
         
+        self.load_csv(csv_path, complete)
+
+    def load_csv(self, csv_path, complete=None):
+        """
+        (Re)loads the grid from csv_path, replacing any rows already shown.
+        Corrections the user already made are applied again on top, and
+        saved if the table is complete. complete, if given, updates
+        self.complete.
+        """
+        if complete is not None:
+            self.complete = complete
         # Read CSV data.
         with open(csv_path, "r", newline="", encoding="utf-8") as f:
             reader = csv.reader(f)
@@ -362,9 +444,66 @@ class ResultsWindow:
             self.tree.heading(header, text=header)
             self.tree.column(header, width=100, anchor="center")
         
+        # Build the table model, re-applying earlier corrections.
+        self.csv_path = csv_path
+        self.model = TableModel(data)
+        for (r, c), value in self.edits.items():
+            self.model.set_cell(r, c, value)
+        if self.edits:
+            if self.complete:
+                self.model.save_csv(self.csv_path)
+            if self.on_interpretation_change is not None:
+                self.on_interpretation_change(self.model.interpretation())
+        
         # Insert remaining rows.
-        for row in data[1:]:
-            self.tree.insert("", "end", values=row)
+        self.tree.delete(*self.tree.get_children())
+        self.items = [self.tree.insert("", "end", values=row) for row in self.model.rows[1:]]
+
+    def begin_edit(self, event):
+        """Opens an entry over the double-clicked cell (the row title column is not editable)."""
+        if self.model is None or self.editor is not None:
+            return
+        item = self.tree.identify_row(event.y)
+        column = self.tree.identify_column(event.x)
+        if not item or not column:
+            return
+        c = int(column[1:]) - 1
+        if c < 1:
+            return
+        r = self.items.index(item) + 1
+        x, y, width, height = self.tree.bbox(item, column)
+
+        self.editor = ttk.Entry(self.tree)
+        self.editor.place(x=x, y=y, width=width, height=height)
+        self.editor.insert(0, self.model.rows[r][c])
+        self.editor.select_range(0, "end")
+        self.editor.focus_set()
+        self.editor.bind("<Return>", lambda e: self.commit_edit(r, c))
+        self.editor.bind("<FocusOut>", lambda e: self.commit_edit(r, c))
+        self.editor.bind("<Escape>", lambda e: self.cancel_edit())
+
+    def cancel_edit(self):
+        if self.editor is not None:
+            self.editor.destroy()
+            self.editor = None
+
+    def commit_edit(self, r, c):
+        """Applies the edited value to the model and refreshes the row and interpretation."""
+        if self.editor is None:
+            return
+        value = self.editor.get()
+        self.cancel_edit()
+        if value.strip() == self.model.rows[r][c]:
+            return
+
+        self.edits[(r, c)] = value
+        changed_sections = self.model.set_cell(r, c, value)
+        # Sign corrections may have changed other cells of the row too.
+        self.tree.item(self.items[r - 1], values=self.model.rows[r])
+        if self.complete:
+            self.model.save_csv(self.csv_path)
+        if changed_sections and self.on_interpretation_change is not None:
+            self.on_interpretation_change(self.model.interpretation())
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -2,75 +2,296 @@
 import cv2
 import numpy as np
 import os
+import json
+import struct
+import hashlib
+import tempfile
 import imutils
 
-def detect_table(template_path, target_path, output_dir="output", threshold=0.2):
-    """
-    Detects the table in target_path using the template_path image.
-    Saves 'table_detected.png' and 'cropped_table.png' to output_dir if successful.
-    Returns True if a match was found and cropped, otherwise False.
-    """
-    os.makedirs(output_dir, exist_ok=True)
+# Scales at which the template is matched against the target image.
+TEMPLATE_SCALES = np.arange(0.5, 1.5, 0.1)
 
-    # Load the template image
+# Precomputed template pyramid, stored next to config.json.
+PYRAMID_FILENAME = "template_pyramid.bin"
+PYRAMID_MAGIC = b"PFTPYR01"
+PYRAMID_VERSION = 1
+PYRAMID_ALIGNMENT = 16
+
+def default_pyramid_path(template_path):
+    """Returns the pyramid artifact path that sits alongside the template image."""
+    return os.path.join(os.path.dirname(os.path.abspath(template_path)), PYRAMID_FILENAME)
+
+def _file_sha1(path):
+    """Returns the SHA-1 hex digest of a file's contents."""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def _read_template(template_path):
+    """Loads the template image in grayscale, raising IOError if it cannot be read."""
     template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
     if template is None:
         raise IOError(f"Template image not found at {template_path}")
+    return template
 
-    # Load the target image
-    target_image = cv2.imread(target_path, cv2.IMREAD_GRAYSCALE)
-    if target_image is None:
-        raise IOError(f"Target image not found at {target_path}")
+def _resize_template(template):
+    """Returns the (scale, template_resized) levels for every scale in TEMPLATE_SCALES."""
+    levels = []
+    for scale in TEMPLATE_SCALES:
+        template_resized = imutils.resize(template, width=int(template.shape[1] * scale))
+        levels.append((float(scale), np.ascontiguousarray(template_resized, dtype=np.uint8)))
+    return levels
+
+def _write_template_pyramid(levels, template_path, pyramid_path):
+    """Writes the levels to pyramid_path in the layout described in build_template_pyramid."""
+    level_info = []
+    offset = 0
+    for scale, template_resized in levels:
+        tH, tW = template_resized.shape[:2]
+        level_info.append({"scale": scale, "offset": offset, "height": tH, "width": tW})
+        offset += tH * tW
 
-    # Initialize variables to keep track of the best match
-    best_match_value = -1
-    best_match_location = None
-    best_match_scale = 1.0
-    best_template_size = (0, 0)
+    header = json.dumps({
+        "version": PYRAMID_VERSION,
+        "template_sha1": _file_sha1(template_path),
+        "levels": level_info,
+    }).encode("utf-8")
+    prefix_len = len(PYRAMID_MAGIC) + 4 + len(header)
+    padding = (-prefix_len) % PYRAMID_ALIGNMENT
 
-    # Define scales to test
-    neighborhood_scales = np.arange(0.5, 1.5, 0.1)
+    # Write to a temporary file first so a reader never sees a partial artifact.
+    # The temporary name is unique so concurrent builders do not clobber each other.
+    fd, tmp_path = tempfile.mkstemp(prefix=PYRAMID_FILENAME + ".", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(pyramid_path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(PYRAMID_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            f.write(b"\0" * padding)
+            for _, template_resized in levels:
+                f.write(template_resized.tobytes())
+        os.replace(tmp_path, pyramid_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    print(f"Template pyramid saved to {pyramid_path}")
 
-    # Iterate over the scales
-    for scale in neighborhood_scales:
-        # Resize the template image
-        template_resized = imutils.resize(template, width=int(template.shape[1] * scale))
-        tH, tW = template_resized.shape[:2]
+def build_template_pyramid(template_path, pyramid_path=None):
+    """
+    Resizes the grayscale template to every scale in TEMPLATE_SCALES and writes
+    all levels into one binary artifact so detect_table can memory-map them
+    instead of reloading and resizing the template on every call.
+
+    File layout:
+      - 8-byte magic, 4-byte little-endian header length, JSON header
+      - zero padding up to a 16-byte boundary
+      - each level's pixels (uint8, row-major), back to back
+
+    The header records the template's SHA-1 so a stale artifact is detected
+    and rebuilt when the template image changes.
+    Returns the list of (scale, template_resized) levels.
+    """
+    if pyramid_path is None:
+        pyramid_path = default_pyramid_path(template_path)
+    levels = _resize_template(_read_template(template_path))
+    _write_template_pyramid(levels, template_path, pyramid_path)
+    return levels
+
+def load_template_pyramid(template_path, pyramid_path=None):
+    """
+    Memory-maps the pyramid artifact and returns its (scale, template_resized) levels.
+    Returns None if the artifact is missing, unreadable, or was built from a
+    different template image.
+    """
+    if pyramid_path is None:
+        pyramid_path = default_pyramid_path(template_path)
+    if not os.path.exists(pyramid_path):
+        return None
+
+    try:
+        with open(pyramid_path, "rb") as f:
+            if f.read(len(PYRAMID_MAGIC)) != PYRAMID_MAGIC:
+                return None
+            (header_len,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_len).decode("utf-8"))
+    except (OSError, ValueError, struct.error):
+        return None
+
+    if header.get("version") != PYRAMID_VERSION:
+        return None
+    if header.get("template_sha1") != _file_sha1(template_path):
+        return None
+
+    prefix_len = len(PYRAMID_MAGIC) + 4 + header_len
+    data_offset = prefix_len + (-prefix_len) % PYRAMID_ALIGNMENT
+    total = sum(level["height"] * level["width"] for level in header["levels"])
+    try:
+        data = np.memmap(pyramid_path, dtype=np.uint8, mode="r", offset=data_offset, shape=(total,))
+    except (OSError, ValueError):
+        return None
+
+    levels = []
+    for level in header["levels"]:
+        start = level["offset"]
+        end = start + level["height"] * level["width"]
+        levels.append((level["scale"], data[start:end].reshape(level["height"], level["width"])))
+    return levels
+
+def get_template_pyramid(template_path, pyramid_path=None):
+    """
+    Returns the template pyramid levels, rebuilding the artifact if it is
+    missing or stale. Falls back to in-memory levels if it cannot be written.
+    """
+    if not os.path.exists(template_path):
+        raise IOError(f"Template image not found at {template_path}")
+    levels = load_template_pyramid(template_path, pyramid_path)
+    if levels is not None:
+        return levels
+    levels = _resize_template(_read_template(template_path))
+    try:
+        _write_template_pyramid(levels, template_path, pyramid_path or default_pyramid_path(template_path))
+    except OSError as e:
+        print(f"Warning: could not save template pyramid ({e}); using in-memory templates.")
+    return levels
+
+def _box_iou(a, b):
+    """Intersection-over-union of two (x1, y1, x2, y2) boxes."""
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def find_table_matches(target_image, pyramid, threshold=0.2, nms_threshold=0.3,
+                       min_relative_score=0.8, max_tables=None):
+    """
+    Returns every template match in target_image scoring at least threshold,
+    after non-maximum suppression across all scales.
 
-        # Skip if the resized template is larger than the target image
+    Each scale contributes the peaks of its TM_CCOEFF_NORMED map, taken
+    greedily with minMaxLoc: after each peak, the map within half a template
+    size around it is cleared. Overlapping candidates with IoU above
+    nms_threshold are suppressed in favour of the higher score, and matches
+    scoring below min_relative_score * best score are dropped so that weak
+    partial matches next to a real table are not reported (peak search at
+    every scale stops as soon as it falls below that bar).
+
+    Each match is a dict with "score", "scale" and "box" (x1, y1, x2, y2).
+    """
+    candidates = []
+    best_score = -1.0
+    for scale, template_resized in pyramid:
+        tH, tW = template_resized.shape[:2]
         if tH > target_image.shape[0] or tW > target_image.shape[1]:
             continue
 
-        # Perform template matching
         result = cv2.matchTemplate(target_image, template_resized, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
-
-        # Update the best match if the current one is better
-        if max_val > best_match_value:
-            best_match_value = max_val
-            best_match_location = max_loc
-            best_match_scale = scale
-            best_template_size = (tW, tH)
-
-    print(f"Best match value: {best_match_value} at scale: {best_match_scale}")
-
-    # Check if a match was found
-    if best_match_value >= threshold:
-        # Calculate the bounding box coordinates
-        top_left = best_match_location
-        tW, tH = best_template_size
-        bottom_right = (top_left[0] + tW, top_left[1] + tH)
-
-        # Draw a rectangle around the detected table
-        detected_image = target_image.copy()
-        cv2.rectangle(detected_image, top_left, bottom_right, (255, 255, 255), 2)
-        cv2.imwrite(os.path.join(output_dir, 'table_detected.png'), detected_image)
-
-        # Crop the detected table from the target image
-        cropped_table = target_image[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]]
-        cv2.imwrite(os.path.join(output_dir, 'cropped_table.png'), cropped_table)
-        print("Table detected and cropped_table.png saved.")
-        return True
-    else:
+        while True:
+            _, max_val, _, (x, y) = cv2.minMaxLoc(result)
+            if max_val < max(threshold, best_score * min_relative_score):
+                break
+            best_score = max(best_score, max_val)
+            candidates.append({
+                "score": float(max_val),
+                "scale": float(scale),
+                "box": (x, y, x + tW, y + tH),
+            })
+            result[max(0, y - tH // 2):y + tH // 2 + 1, max(0, x - tW // 2):x + tW // 2 + 1] = -1.0
+
+    candidates.sort(key=lambda m: m["score"], reverse=True)
+    matches = []
+    for candidate in candidates:
+        if matches and candidate["score"] < matches[0]["score"] * min_relative_score:
+            break
+        if all(_box_iou(candidate["box"], kept["box"]) <= nms_threshold for kept in matches):
+            matches.append(candidate)
+            if max_tables is not None and len(matches) >= max_tables:
+                break
+
+    return sort_reading_order(matches)
+
+def sort_reading_order(matches):
+    """
+    Sorts matches top-to-bottom, then left-to-right. Matches whose tops lie
+    within half the median match height of the first match in a row are
+    treated as one row, so side-by-side tables with slightly different tops
+    still come out left-to-right.
+    """
+    if not matches:
+        return matches
+    tolerance = 0.5 * float(np.median([m["box"][3] - m["box"][1] for m in matches]))
+    rows = []
+    for match in sorted(matches, key=lambda m: m["box"][1]):
+        if rows and match["box"][1] - rows[-1][0]["box"][1] <= tolerance:
+            rows[-1].append(match)
+        else:
+            rows.append([match])
+    return [match for row in rows for match in sorted(row, key=lambda m: m["box"][0])]
+
+def detect_tables(template_path, target_path, output_dir="output", threshold=0.2,
+                  nms_threshold=0.3, min_relative_score=0.8, max_tables=None, pyramid_path=None):
+    """
+    Detects every table in target_path that matches the template_path image.
+    Saves 'table_detected.png' with all matches outlined to output_dir, and
+    each match as output_dir/table_{k}/cropped_table.png (k starting at 1).
+    Returns the list of cropped table paths, empty if nothing matched.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    pyramid = get_template_pyramid(template_path, pyramid_path)
+    target_image = cv2.imread(target_path, cv2.IMREAD_GRAYSCALE)
+    if target_image is None:
+        raise IOError(f"Target image not found at {target_path}")
+
+    matches = find_table_matches(target_image, pyramid, threshold=threshold,
+                                 nms_threshold=nms_threshold,
+                                 min_relative_score=min_relative_score,
+                                 max_tables=max_tables)
+    if not matches:
+        print("No good match found.")
+        return []
+
+    detected_image = target_image.copy()
+    cropped_paths = []
+    for k, match in enumerate(matches, start=1):
+        x1, y1, x2, y2 = match["box"]
+        print(f"Table {k}: match value {match['score']} at scale {match['scale']}")
+        cv2.rectangle(detected_image, (x1, y1), (x2, y2), (255, 255, 255), 2)
+
+        table_dir = os.path.join(output_dir, f"table_{k}")
+        os.makedirs(table_dir, exist_ok=True)
+        cropped_path = os.path.join(table_dir, "cropped_table.png")
+        cv2.imwrite(cropped_path, target_image[y1:y2, x1:x2])
+        cropped_paths.append(cropped_path)
+
+    cv2.imwrite(os.path.join(output_dir, 'table_detected.png'), detected_image)
+    print(f"{len(cropped_paths)} table(s) detected and cropped.")
+    return cropped_paths
+
+def detect_table(template_path, target_path, output_dir="output", threshold=0.2, pyramid_path=None):
+    """
+    Detects the best-matching table in target_path using the template_path image.
+    Saves 'table_detected.png' and 'cropped_table.png' to output_dir if successful.
+    Returns True if a match was found and cropped, otherwise False.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    pyramid = get_template_pyramid(template_path, pyramid_path)
+    target_image = cv2.imread(target_path, cv2.IMREAD_GRAYSCALE)
+    if target_image is None:
+        raise IOError(f"Target image not found at {target_path}")
+
+    matches = find_table_matches(target_image, pyramid, threshold=threshold, max_tables=1)
+    if not matches:
         print("No good match found.")
         return False
+
+    x1, y1, x2, y2 = matches[0]["box"]
+    print(f"Best match value: {matches[0]['score']} at scale: {matches[0]['scale']}")
+    detected_image = target_image.copy()
+    cv2.rectangle(detected_image, (x1, y1), (x2, y2), (255, 255, 255), 2)
+    cv2.imwrite(os.path.join(output_dir, 'table_detected.png'), detected_image)
+    cv2.imwrite(os.path.join(output_dir, 'cropped_table.png'), target_image[y1:y2, x1:x2])
+    print("Table detected and cropped_table.png saved.")
+    return True
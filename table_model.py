@@ -0,0 +1,45 @@
+from ocr_paddle import SIGN_DEPENDENCIES, apply_sign_corrections, write_table_csv
+from interpretation import SECTION_ROWS, parse_table, interpretation_sections, join_sections
+
+class TableModel:
+    """
+    In-memory copy of an OCR results table that supports editing single cells.
+
+    An edit re-applies only the sign corrections that depend on the edited
+    column, and recomputes only the interpretation sections that read the
+    edited row (see SECTION_ROWS); the other sections are kept as they were.
+    """
+    def __init__(self, rows):
+        # rows is the CSV data as a list of rows, header first.
+        self.rows = [list(row) for row in rows]
+        self.data = parse_table(self.rows) if len(self.rows) >= 2 else {}
+        # The row each title maps to in self.data (later rows win, as in parse_table).
+        self._data_rows = {row[0].strip(): r for r, row in enumerate(self.rows[1:], start=1) if row}
+        self.sections = interpretation_sections(self.data)
+
+    def set_cell(self, r, c, value):
+        """
+        Sets the cell at CSV row r, column c (both >= 1) and updates what
+        depends on it. Returns the names of the recomputed sections.
+        """
+        row = self.rows[r]
+        row[c] = value.strip()
+        apply_sign_corrections(row, [col for col, deps in SIGN_DEPENDENCIES.items() if c in deps])
+
+        title = row[0].strip()
+        if self._data_rows.get(title) != r:
+            return []
+        self.data[title] = dict(zip(self.rows[0][1:], row[1:]))
+        changed = [name for name, titles in SECTION_ROWS.items() if title in titles]
+        self.sections.update(interpretation_sections(self.data, changed))
+        return changed
+
+    def interpretation(self):
+        """Returns the full interpretation text, as interpret_pft would for this table."""
+        if len(self.rows) < 2:
+            return "No data available."
+        return join_sections(self.sections)
+
+    def save_csv(self, csv_path):
+        """Writes the (edited) table back to csv_path."""
+        return write_table_csv(self.rows, csv_path)
@@ -0,0 +1,94 @@
+"""
+Guards the split of interpret_pft into sections (SECTION_ROWS) and the
+incremental re-interpretation in TableModel.
+
+The golden file holds interpret_pft's output from before the split, for the
+randomized tables produced by random_table(seed) below. Do not regenerate it
+from the current code: it is the reference the sections are checked against.
+"""
+import csv
+import json
+import os
+import random
+
+import pytest
+
+from interpretation import interpret_pft
+from ocr_paddle import apply_sign_corrections
+from table_model import TableModel
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_PATH = os.path.join(HERE, "data", "interpretation_golden.json")
+
+COLUMN_TITLES = ["var", "pre", "zscore", "lln", "%predpre", "post", "zscore post", "%predpost", "%changepost"]
+ROW_TITLES = ["fvc", "fev1", "fev1/fvc", "fef25-75%", "testgrade", "svc", "rvpleth", "tlcpleth",
+              "rv/tlcpleth", "dlcounc", "dlcocor", "kco"]
+TEST_GRADES = ["AA", "A", "B", "C", "D", "F", "", "aa"]
+
+# (low, high) of the random values in each data column; z-scores straddle the
+# -1.645 / -2.5 / -4.0 / 1.65 cut-offs, %pred straddles 100 and 175.
+COLUMN_RANGES = {1: (0.5, 6.0), 2: (-5.5, 3.0), 3: (0.5, 6.0), 4: (40.0, 200.0),
+                 5: (0.5, 6.0), 6: (-5.5, 3.0), 7: (40.0, 200.0), 8: (0.0, 30.0)}
+
+def _value(rng, column):
+    # Only rng.random() is used: its sequence for a given seed is stable across Python versions.
+    r = rng.random()
+    if r < 0.12:
+        return ""
+    if r < 0.15:
+        return "n/a"
+    low, high = COLUMN_RANGES[column]
+    return f"{low + (high - low) * rng.random():.2f}"
+
+def random_table(seed):
+    """Returns a randomized PFT table as CSV rows, header first."""
+    rng = random.Random(seed)
+    rows = [list(COLUMN_TITLES)]
+    for title in ROW_TITLES:
+        row = [title] + [_value(rng, c) for c in range(1, len(COLUMN_TITLES))]
+        if title == "testgrade":
+            row[5] = TEST_GRADES[int(rng.random() * len(TEST_GRADES))]
+        rows.append(row)
+    return rows
+
+def _write_csv(rows, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+    return str(path)
+
+def _golden():
+    with open(GOLDEN_PATH, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    return [golden["texts"][k] for k in golden["cases"]]
+
+def test_interpret_pft_matches_golden(tmp_path):
+    expected = _golden()
+    for seed, text in enumerate(expected):
+        csv_path = _write_csv(random_table(seed), tmp_path / f"table_{seed}.csv")
+        assert interpret_pft(csv_path) == text, f"seed {seed}"
+
+@pytest.mark.parametrize("seed", range(50))
+def test_table_model_edits_match_full_recompute(tmp_path, seed):
+    rng = random.Random(1000 + seed)
+    rows = random_table(seed)
+    # Start from sign-corrected rows, as perform_ocr writes them.
+    for row in rows[1:]:
+        apply_sign_corrections(row)
+    model = TableModel(rows)
+    reference = [list(row) for row in rows]
+
+    for _ in range(20):
+        r = 1 + int(rng.random() * (len(rows) - 1))
+        c = 1 + int(rng.random() * (len(COLUMN_TITLES) - 1))
+        value = _value(rng, c)
+        model.set_cell(r, c, value)
+        reference[r][c] = value.strip()
+        apply_sign_corrections(reference[r])
+
+        assert model.rows == reference
+        csv_path = _write_csv(reference, tmp_path / "reference.csv")
+        assert model.interpretation() == interpret_pft(csv_path)
+
+    model.save_csv(str(tmp_path / "saved.csv"))
+    with open(tmp_path / "saved.csv", newline="", encoding="utf-8") as f:
+        assert list(csv.reader(f)) == reference
@@ -0,0 +1,256 @@
+"""
+Watch-folder ingestion: processes report screenshots as they appear in a folder.
+
+New image files are picked up once their size and modification time have
+stopped changing, queued on a bounded queue (the scanner waits while it is
+full), and processed by a pool of workers through the same pipeline as the
+Run button: detect_tables -> segment_cells -> perform_ocr -> interpret_pft.
+
+Each image's results are built in a temporary directory and renamed into
+results_dir/<image file name>/ in one step, so a result directory is either
+complete or absent. Its status.json records the size and mtime of the source
+file; an image is skipped when they still match, which lets the watcher
+restart without reprocessing finished files while still picking up a
+re-export under the same name. A failed image is recorded in
+results_dir/<image file name>.failed.json and retried up to --max-attempts
+times per version of the file.
+
+Run it with:
+    python watch_folder.py WATCH_DIR [--results-dir DIR] [--workers N] [--queue-size N]
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+
+from pipeline import process_screenshot
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"}
+TMP_PREFIX = ".tmp-"
+FAILED_SUFFIX = ".failed.json"
+
+class WatchFolder:
+    def __init__(self, watch_dir, results_dir, template_path="table_template.png",
+                 config_path="config.json", workers=2, queue_size=8, poll_interval=1.0, threshold=0.2,
+                 max_attempts=3):
+        self.watch_dir = watch_dir
+        self.results_dir = results_dir
+        self.template_path = template_path
+        self.config_path = config_path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.threshold = threshold
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self._last_seen = {}  # file name -> (size, mtime_ns) from the previous scan
+        self._completed = {}  # file name -> (size, mtime_ns) recorded in its status.json
+        self._reported_failures = set()
+
+    def result_dir_for(self, filename):
+        return os.path.join(self.results_dir, filename)
+
+    def failure_marker_for(self, filename):
+        return os.path.join(self.results_dir, filename + FAILED_SUFFIX)
+
+    def _completed_signature(self, filename):
+        """Returns the (size, mtime_ns) of the source its published results were built from."""
+        if filename not in self._completed:
+            signature = None
+            try:
+                with open(os.path.join(self.result_dir_for(filename), "status.json"), "r") as f:
+                    status = json.load(f)
+                signature = (status["source_size"], status["source_mtime_ns"])
+            except (OSError, ValueError, KeyError):
+                pass
+            self._completed[filename] = signature
+        return self._completed[filename]
+
+    def _failed_attempts(self, filename, signature):
+        """Returns how many times this version of the file has already failed."""
+        try:
+            with open(self.failure_marker_for(filename), "r") as f:
+                failure = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if (failure.get("source_size"), failure.get("source_mtime_ns")) != signature:
+            return 0
+        return failure.get("attempts", 0)
+
+    def _cleanup_partial_results(self):
+        """Removes temporary result directories left behind by an interrupted run."""
+        for name in os.listdir(self.results_dir):
+            if name.startswith(TMP_PREFIX):
+                shutil.rmtree(os.path.join(self.results_dir, name), ignore_errors=True)
+
+    def scan(self):
+        """
+        Returns (file name, (size, mtime_ns)) for the files that are ready to be
+        queued: image files whose results were not built from this exact
+        version of the file, that have not failed max_attempts times, that are
+        not already queued, and that are unchanged since the last scan.
+        """
+        ready = []
+        seen = {}
+        for entry in os.scandir(self.watch_dir):
+            if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            with self._in_flight_lock:
+                if entry.name in self._in_flight:
+                    continue
+            stat = entry.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            # A re-export under the same name has a new size/mtime and is processed again.
+            if self._completed_signature(entry.name) == signature:
+                continue
+            if self._failed_attempts(entry.name, signature) >= self.max_attempts:
+                if (entry.name, signature) not in self._reported_failures:
+                    self._reported_failures.add((entry.name, signature))
+                    print(f"{entry.name}: skipped after {self.max_attempts} failed attempts; "
+                          f"see {self.failure_marker_for(entry.name)}")
+                continue
+            seen[entry.name] = signature
+            # Wait for the exporter to finish writing the file.
+            if self._last_seen.get(entry.name) == signature and stat.st_size > 0:
+                ready.append((entry.name, signature))
+        self._last_seen = seen
+        return sorted(ready)
+
+    def _publish(self, tmp_dir, filename):
+        """Moves tmp_dir into place as the result directory, replacing older results."""
+        final_dir = self.result_dir_for(filename)
+        old_dir = None
+        if os.path.isdir(final_dir):
+            old_dir = os.path.join(self.results_dir, f"{TMP_PREFIX}old-{filename}-{uuid.uuid4().hex}")
+            os.replace(final_dir, old_dir)
+        os.replace(tmp_dir, final_dir)
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+    def process_file(self, filename, signature):
+        """
+        Runs the pipeline on one image and atomically publishes its results.
+        A failure is recorded in <file name>.failed.json next to the results,
+        with the error and the number of attempts for this version of the file.
+        """
+        image_path = os.path.join(self.watch_dir, filename)
+        tmp_dir = os.path.join(self.results_dir, f"{TMP_PREFIX}{filename}-{uuid.uuid4().hex}")
+        try:
+            results = process_screenshot(self.template_path, image_path, output_dir=tmp_dir,
+                                         config_path=self.config_path, threshold=self.threshold)
+            os.makedirs(tmp_dir, exist_ok=True)
+            for result in results:
+                with open(os.path.join(result["table_dir"], "interpretation.txt"), "w", encoding="utf-8") as f:
+                    f.write(result["interpretation"])
+            with open(os.path.join(tmp_dir, "status.json"), "w") as f:
+                json.dump({
+                    "source": image_path,
+                    "source_size": signature[0],
+                    "source_mtime_ns": signature[1],
+                    "tables": [os.path.relpath(r["table_dir"], tmp_dir) for r in results],
+                    "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }, f, indent=2)
+            self._publish(tmp_dir, filename)
+            self._completed[filename] = signature
+            if os.path.exists(self.failure_marker_for(filename)):
+                os.remove(self.failure_marker_for(filename))
+            print(f"{filename}: {len(results)} table(s) processed.")
+        except Exception as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            attempts = self._failed_attempts(filename, signature) + 1
+            with open(self.failure_marker_for(filename), "w") as f:
+                json.dump({
+                    "source": image_path,
+                    "source_size": signature[0],
+                    "source_mtime_ns": signature[1],
+                    "attempts": attempts,
+                    "error": repr(e),
+                    "failed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }, f, indent=2)
+            if attempts < self.max_attempts:
+                print(f"{filename}: processing failed ({e}); retrying (attempt {attempts} of {self.max_attempts}).")
+            else:
+                print(f"{filename}: processing failed ({e}); giving up after {attempts} attempts.")
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            filename, signature = item
+            try:
+                self.process_file(filename, signature)
+            finally:
+                with self._in_flight_lock:
+                    self._in_flight.discard(filename)
+
+    def _enqueue(self, filename, signature):
+        """Blocks while the queue is full, so the scanner never runs ahead of the workers."""
+        with self._in_flight_lock:
+            self._in_flight.add(filename)
+        while not self._stop.is_set():
+            try:
+                self._queue.put((filename, signature), timeout=self.poll_interval)
+                return
+            except queue.Full:
+                continue
+
+    def run(self):
+        """Scans the watch folder until stop() is called or the process is interrupted."""
+        os.makedirs(self.results_dir, exist_ok=True)
+        self._cleanup_partial_results()
+        threads = [threading.Thread(target=self._worker, name=f"watch-worker-{k}", daemon=True)
+                   for k in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        print(f"Watching {self.watch_dir} with {self.workers} worker(s); results go to {self.results_dir}")
+        try:
+            while not self._stop.is_set():
+                for filename, signature in self.scan():
+                    self._enqueue(filename, signature)
+                    if self._stop.is_set():
+                        break
+                self._stop.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            print("Stopping watcher; waiting for in-progress files to finish.")
+        finally:
+            self._stop.set()
+            # Drop queued-but-unstarted files; they are picked up again on restart.
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            for _ in threads:
+                self._queue.put(None)
+            for thread in threads:
+                thread.join()
+
+    def stop(self):
+        self._stop.set()
+
+def main():
+    parser = argparse.ArgumentParser(description="Process PFT report screenshots dropped into a folder.")
+    parser.add_argument("watch_dir", help="Folder the lab system exports screenshots to.")
+    parser.add_argument("--results-dir", default="watch_results")
+    parser.add_argument("--template", default="table_template.png")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--workers", type=int, default=2, help="Number of images processed concurrently.")
+    parser.add_argument("--queue-size", type=int, default=8, help="Max images waiting for a worker.")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between folder scans.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Template match threshold.")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per file before giving up.")
+    args = parser.parse_args()
+
+    WatchFolder(args.watch_dir, args.results_dir, template_path=args.template, config_path=args.config,
+                workers=args.workers, queue_size=args.queue_size, poll_interval=args.poll_interval,
+                threshold=args.threshold, max_attempts=args.max_attempts).run()
+
+if __name__ == "__main__":
+    main()